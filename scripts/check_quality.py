@@ -11,7 +11,7 @@ import argparse
 from query_huawei import query
 
 
-def check_quality(query_text, protocol=None, threshold=0.5):
+def check_quality(query_text, protocol=None, threshold=0.5, index_path=None):
     """
     检查查询结果质量
 
@@ -19,11 +19,14 @@ def check_quality(query_text, protocol=None, threshold=0.5):
         query_text: 查询文本
         protocol: 协议过滤器
         threshold: 质量阈值（相似度分数）
+        index_path: 可选的预构建索引文件
 
     Returns:
         dict: 质量报告
     """
-    results = query(query_text, top_k=10, filter_protocol=protocol)
+    results = query(
+        query_text, top_k=10, filter_protocol=protocol, index_path=index_path
+    )
 
     if not results:
         return {
@@ -46,7 +49,7 @@ def check_quality(query_text, protocol=None, threshold=0.5):
 
     # 检查协议一致性
     if protocol:
-        correct_protocol = [r for r in results if r.get("protocol") == protocol]
+        correct_protocol = [r for r in results if protocol in r.get("protocols", [])]
         protocol_accuracy = len(correct_protocol) / len(results) if results else 0
     else:
         protocol_accuracy = None
@@ -120,19 +123,24 @@ def main():
         default=0.5,
         help="Quality threshold (default: 0.5)",
     )
+    parser.add_argument(
+        "--index", "-i", help="Prebuilt index artifact instead of ChromaDB"
+    )
     args = parser.parse_args()
 
     print(f'\n🔍 检查查询: "{args.query}"')
     if args.protocol:
         print(f"🎯 协议过滤: {args.protocol}")
 
-    report = check_quality(args.query, args.protocol, args.threshold)
+    report = check_quality(args.query, args.protocol, args.threshold, args.index)
     print(format_report(report))
 
     # 显示最佳结果预览
     if report["total_results"] > 0:
         print("\n📋 最佳结果预览:")
-        results = query(args.query, top_k=3, filter_protocol=args.protocol)
+        results = query(
+            args.query, top_k=3, filter_protocol=args.protocol, index_path=args.index
+        )
         for i, r in enumerate(results, 1):
             print(f"\n[{i}] {r['title'][:60]}...")
             print(f"    Score: {r['score']:.2%} | Protocol: {r['protocol']}")
@@ -0,0 +1,125 @@
+"""
+dedup.py - 近重复文本块检测（MinHash + LSH）
+
+华为 CHM 文档中大量页面在不同特性章节、不同版本间几乎相同。
+摄入时用 MinHash 签名和 LSH 分桶找出近重复块，只保留一个规范块；
+查询时对候选结果再做一次折叠，让 top_k 中每条结果都有独立内容。
+"""
+
+import re
+import zlib
+
+import numpy as np
+
+SHINGLE_SIZE = 5  # 字符 n-gram，中文文本不依赖分词
+NUM_PERM = 64
+LSH_BANDS = 8  # 8 段 x 8 行，候选阈值约 (1/8)^(1/8) ≈ 0.77
+DEDUP_THRESHOLD = 0.85  # 估计 Jaccard 相似度达到此值视为近重复
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240613)  # 固定种子，签名跨进程稳定
+_PERM_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.int64)
+_PERM_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.int64)
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """计算文本的 MinHash 签名"""
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {
+            text[i : i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)
+        }
+
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) % _PRIME for s in shingles),
+        dtype=np.int64,
+        count=len(shingles),
+    )
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _PRIME
+    return permuted.min(axis=0)
+
+
+def estimated_similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """由签名估计 Jaccard 相似度"""
+    return float(np.mean(sig_a == sig_b))
+
+
+class NearDuplicateIndex:
+    """LSH 索引：判断新文本是否与已收录文本近重复"""
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self._rows = NUM_PERM // LSH_BANDS
+        self._buckets = [{} for _ in range(LSH_BANDS)]
+        self._signatures = {}
+
+    def find_or_add(self, key: str, text: str):
+        """
+        查找近重复的已收录文本
+
+        Returns:
+            已收录文本的 key；没有近重复时收录当前文本并返回 None
+        """
+        signature = minhash_signature(text)
+        bands = self._bands(signature)
+
+        checked = set()
+        for buckets, band in zip(self._buckets, bands):
+            for candidate in buckets.get(band, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if (
+                    estimated_similarity(signature, self._signatures[candidate])
+                    >= self.threshold
+                ):
+                    return candidate
+
+        self._signatures[key] = signature
+        for buckets, band in zip(self._buckets, bands):
+            buckets.setdefault(band, []).append(key)
+        return None
+
+    def remove(self, key: str):
+        """移除已收录文本（例如其所在批次写入失败）"""
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for buckets, band in zip(self._buckets, self._bands(signature)):
+            keys = buckets.get(band, [])
+            if key in keys:
+                keys.remove(key)
+            if not keys:
+                buckets.pop(band, None)
+
+    def _bands(self, signature: np.ndarray) -> list:
+        return [
+            signature[i * self._rows : (i + 1) * self._rows].tobytes()
+            for i in range(LSH_BANDS)
+        ]
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+
+def collapse_near_duplicates(
+    texts: list, threshold: float = DEDUP_THRESHOLD
+) -> list:
+    """
+    折叠近重复文本（输入按相关度排序，保留每组中排名最前的一条）
+
+    Returns:
+        list of (保留的下标, [被折叠的下标])
+    """
+    signatures = [minhash_signature(t) for t in texts]
+    groups = []
+    for i, signature in enumerate(signatures):
+        for kept, duplicates in groups:
+            if estimated_similarity(signature, signatures[kept]) >= threshold:
+                duplicates.append(i)
+                break
+        else:
+            groups.append((i, []))
+    return groups
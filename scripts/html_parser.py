@@ -13,6 +13,10 @@ from bs4 import BeautifulSoup
 from pathlib import Path
 import re
 
+# 解析器版本：修改解析逻辑后递增，使解析缓存失效
+# （协议关键词表的变化由 parse_cache 按哈希自动识别）
+PARSER_VERSION = "3"
+
 
 def parse_huawei_html(file_path: str) -> dict:
     """
@@ -26,7 +30,7 @@ def parse_huawei_html(file_path: str) -> dict:
             "text": str,        # 清理后的文本内容
             "commands": list,   # 提取的命令列表
             "title": str,       # 文档标题
-            "metadata": dict    # 元数据（文件名、协议类型等）
+            "metadata": dict    # 元数据（文件名、主协议、协议标签及命中次数等）
         }
     """
     # 读取文件，处理 GB2312 编码
@@ -101,8 +105,8 @@ def parse_huawei_html(file_path: str) -> dict:
     text = re.sub(r"\n{3,}", "\n\n", text)
     text = re.sub(r" {2,}", " ", text)
 
-    # 推断协议类型
-    protocol = infer_protocol(file_path, text)
+    # 推断协议类型（多标签 + 主协议）
+    protocol_tags, protocol = scan_protocols(file_path, text)
 
     return {
         "text": text,
@@ -111,42 +115,143 @@ def parse_huawei_html(file_path: str) -> dict:
         "metadata": {
             "source_file": str(file_path),
             "protocol": protocol,
+            "protocol_tags": protocol_tags,
             "command_count": len(unique_commands),
         },
     }
 
 
-def infer_protocol(file_path: str, text: str) -> str:
-    """根据文件名和内容推断协议类型"""
-    path_lower = str(file_path).lower()
-    text_lower = text.lower()[:2000]  # 只检查前2000字符
-
-    # 协议关键词映射（优先级从高到低）
-    protocols = [
-        ("ospf", ["ospf", "ospfv3"]),
-        ("bgp", ["bgp", "ebgp", "ibgp"]),
-        ("ipsec", ["ipsec", "ike-peer", "ike proposal"]),
-        ("vpn", ["vpn", "ssl-vpn", "l2tp", "pptp"]),
-        ("nat", ["nat-policy", "nat server", "nat address-group", "napt"]),
-        ("acl", ["acl number", "acl name", "access-list"]),
-        ("firewall", ["firewall zone", "security-policy", "trust", "untrust"]),
-        ("vlan", ["vlan", "vlanif", "trunk", "access"]),
-        ("interface", ["interface", "eth-trunk", "gigabitethernet"]),
-        ("routing", ["ip route", "route-policy", "static route"]),
-        ("qos", ["qos", "traffic-policy", "traffic-classifier"]),
-        ("aaa", ["aaa", "authentication", "authorization", "accounting"]),
-        ("dns", ["dns", "domain"]),
-        ("ntp", ["ntp"]),
-        ("snmp", ["snmp"]),
-        ("syslog", ["syslog", "info-center"]),
-    ]
-
-    for proto, keywords in protocols:
+# 主协议只根据文件路径和正文前若干字符判断
+PRIMARY_SCAN_CHARS = 2000
+
+# 协议关键词映射（优先级从高到低）
+PROTOCOL_KEYWORDS = [
+    ("ospf", ["ospf", "ospfv3"]),
+    ("bgp", ["bgp", "ebgp", "ibgp"]),
+    ("ipsec", ["ipsec", "ike-peer", "ike proposal"]),
+    ("vpn", ["vpn", "ssl-vpn", "l2tp", "pptp"]),
+    ("nat", ["nat-policy", "nat server", "nat address-group", "napt"]),
+    ("acl", ["acl number", "acl name", "access-list"]),
+    ("firewall", ["firewall zone", "security-policy", "trust", "untrust"]),
+    ("vlan", ["vlan", "vlanif", "trunk", "access"]),
+    ("interface", ["interface", "eth-trunk", "gigabitethernet"]),
+    ("routing", ["ip route", "route-policy", "static route"]),
+    ("qos", ["qos", "traffic-policy", "traffic-classifier"]),
+    ("aaa", ["aaa", "authentication", "authorization", "accounting"]),
+    ("dns", ["dns", "domain"]),
+    ("ntp", ["ntp"]),
+    ("snmp", ["snmp"]),
+    ("syslog", ["syslog", "info-center"]),
+]
+
+
+def _build_trie_pattern(keywords: list) -> str:
+    """把关键词构造成前缀树形式的正则，匹配开销只与关键词长度相关"""
+    trie = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def render(node: dict) -> str:
+        # 终止标记表示当前前缀本身就是一个关键词（可选的更长匹配）
+        optional = "" in node
+        branches = [re.escape(ch) + render(child) for ch, child in node.items() if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        body = "(?:" + "|".join(sorted(branches)) + ")"
+        return body + "?" if optional else body
+
+    return render(trie)
+
+
+def _compile_protocol_matcher(table: list):
+    """
+    编译协议关键词表：返回 (正则, 最长关键词→协议列表)
+
+    正则放在先行断言里，每个位置都尝试匹配，结果可以互相重叠；
+    每个位置只返回最长的关键词，因此同一位置起始的较短关键词
+    （如 ospfv3 中的 ospf）的协议也合并到最长关键词名下。
+    """
+    keyword_map = {}
+    for proto, keywords in table:
         for kw in keywords:
-            if kw in path_lower or kw in text_lower:
-                return proto
+            keyword_map.setdefault(kw, [])
+            if proto not in keyword_map[kw]:
+                keyword_map[kw].append(proto)
+
+    prefix_map = {}
+    for kw in keyword_map:
+        protos = []
+        for other, other_protos in keyword_map.items():
+            if kw.startswith(other):
+                protos.extend(p for p in other_protos if p not in protos)
+        prefix_map[kw] = protos
+
+    pattern = re.compile("(?=(" + _build_trie_pattern(list(keyword_map)) + "))")
+    return pattern, prefix_map
+
+
+_PROTOCOL_PATTERN, _KEYWORD_PROTOCOLS = _compile_protocol_matcher(PROTOCOL_KEYWORDS)
+_PROTOCOL_PRIORITY = [proto for proto, _ in PROTOCOL_KEYWORDS]
+
+
+def scan_protocols(file_path: str, text: str) -> tuple:
+    """
+    单遍扫描文件路径和全文，统计各协议关键词命中次数并确定主协议
+
+    所有关键词编译成一个前缀树正则，关键词表扩充时扫描开销基本不变。
+    匹配可以重叠，与逐个关键词做子串判断的旧逻辑一致，例如:
 
-    return "general"
+        文本            命中标签
+        eth-trunk       interface (eth-trunk), vlan (trunk)
+        untrust         firewall (untrust, trust)
+        access-list     acl (access-list), vlan (access)
+        ospfv3          ospf (ospf, ospfv3)
+        vlanif          vlan (vlan, vlanif)
+        ssl-vpn         vpn (ssl-vpn, vpn)
+        ebgp            bgp (ebgp, bgp)
+
+    命中次数按关键词出现的起始位置计，同一位置同一协议只计一次。
+    主协议沿用旧规则：只看文件路径和正文前 PRIMARY_SCAN_CHARS 个字符，
+    取其中优先级最高的协议，避免正文末尾"相关主题"等处的零星提及改变主协议。
+
+    Returns:
+        (dict, str): ({协议: 命中次数}，按优先级排序; 主协议)
+    """
+    counts = {}
+    primary_hits = set()
+
+    for match in _PROTOCOL_PATTERN.finditer(str(file_path).lower()):
+        for proto in _KEYWORD_PROTOCOLS[match.group(1)]:
+            counts[proto] = counts.get(proto, 0) + 1
+            primary_hits.add(proto)
+
+    for match in _PROTOCOL_PATTERN.finditer(text.lower()):
+        in_head = match.start() < PRIMARY_SCAN_CHARS
+        for proto in _KEYWORD_PROTOCOLS[match.group(1)]:
+            counts[proto] = counts.get(proto, 0) + 1
+            if in_head:
+                primary_hits.add(proto)
+
+    tags = {proto: counts[proto] for proto in _PROTOCOL_PRIORITY if proto in counts}
+    primary = next(
+        (proto for proto in _PROTOCOL_PRIORITY if proto in primary_hits), "general"
+    )
+    return tags, primary
+
+
+def tag_protocols(file_path: str, text: str) -> dict:
+    """统计文件路径和全文中各协议关键词命中次数（按优先级排序）"""
+    return scan_protocols(file_path, text)[0]
+
+
+def infer_protocol(file_path: str, text: str) -> str:
+    """根据文件名和正文开头推断主协议类型"""
+    return scan_protocols(file_path, text)[1]
 
 
 def extract_config_blocks(text: str) -> list:
@@ -175,6 +280,7 @@ if __name__ == "__main__":
 
         print(f"Title: {result['title']}")
         print(f"Protocol: {result['metadata']['protocol']}")
+        print(f"Protocol tags: {result['metadata']['protocol_tags']}")
         print(f"Text length: {len(result['text'])}")
         print(f"Commands found: {len(result['commands'])}")
 
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+index_artifact.py - 预构建索引文件的导出与导入
+
+将 ChromaDB 集合打包成单个只读、带版本的索引文件（向量、ID、文档、
+元数据和清单），新机器或容器无需重新摄入即可直接查询。
+
+文件布局:
+    MAGIC (8 字节) | 格式版本 uint32 | 清单长度 uint32 | 清单 JSON
+    向量矩阵 float32[count, dim]   (按 64 字节对齐)
+    向量平方范数 float32[count]
+    协议标记 uint8[count, len(清单 protocols)]  (过滤时无需解码记录)
+    记录偏移 uint64[count + 1]
+    记录 JSON（id, document, metadata）逐条拼接
+
+查询时通过 mmap 打开，只读取命中的记录，加载时间与索引大小无关。
+
+用法:
+    python index_artifact.py export huawei_docs.hwidx
+    python index_artifact.py import huawei_docs.hwidx --reset
+    python index_artifact.py info huawei_docs.hwidx
+"""
+
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+import json
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+from index_profiles import DEFAULT_PROFILE, hnsw_configuration
+
+# 配置
+CHROMA_PATH = Path.home() / ".local/share/huawei-rag/data/chroma"
+COLLECTION_NAME = "huawei_docs"
+EMBEDDING_MODEL = "thenlper/gte-large-zh"
+
+MAGIC = b"HWRAGIDX"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<8sII")
+_ALIGN = 64
+_MANIFEST_INT_KEYS = (
+    "count",
+    "dim",
+    "vectors_offset",
+    "norms_offset",
+    "protocols_offset",
+    "offsets_offset",
+    "records_offset",
+)
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def matches_protocol(metadata: dict, protocol: str) -> bool:
+    """与 query_huawei.protocol_filter 一致：主协议或任一协议标签命中"""
+    return (
+        metadata.get("protocol") == protocol
+        or metadata.get(f"proto_{protocol}", 0) > 0
+    )
+
+
+def write_artifact(
+    path: str,
+    ids: list,
+    documents: list,
+    metadatas: list,
+    embeddings,
+    manifest: dict,
+):
+    """写出索引文件（先写临时文件再原子替换，完成后设为只读）"""
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    count, dim = vectors.shape
+
+    records = [
+        json.dumps(
+            {"id": doc_id, "document": doc, "metadata": meta},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        for doc_id, doc, meta in zip(ids, documents, metadatas)
+    ]
+    offsets = np.zeros(count + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(r) for r in records], dtype=np.uint64)
+
+    # 每条记录匹配哪些协议（主协议或任一协议标签），查询过滤直接用这个矩阵
+    protocols = sorted(
+        {meta["protocol"] for meta in metadatas if meta.get("protocol")}
+        | {
+            key[len("proto_") :]
+            for meta in metadatas
+            for key in meta
+            if key.startswith("proto_")
+        }
+    )
+    protocol_flags = np.array(
+        [[matches_protocol(meta, p) for p in protocols] for meta in metadatas],
+        dtype=np.uint8,
+    ).reshape(count, len(protocols))
+
+    manifest = dict(manifest, count=count, dim=dim, protocols=protocols)
+
+    # 清单里的偏移量依赖清单本身的长度，反复计算直到布局稳定
+    vectors_offset = 0
+    while True:
+        manifest["vectors_offset"] = vectors_offset
+        manifest["norms_offset"] = _align(vectors_offset + vectors.nbytes)
+        manifest["protocols_offset"] = _align(manifest["norms_offset"] + count * 4)
+        manifest["offsets_offset"] = _align(
+            manifest["protocols_offset"] + protocol_flags.nbytes
+        )
+        manifest["records_offset"] = _align(
+            manifest["offsets_offset"] + offsets.nbytes
+        )
+        manifest_bytes = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+        needed = _align(_HEADER.size + len(manifest_bytes))
+        if needed == vectors_offset:
+            break
+        vectors_offset = needed
+
+    norms = np.einsum("ij,ij->i", vectors, vectors).astype(np.float32)
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(manifest_bytes)))
+        f.write(manifest_bytes)
+        for key, block in [
+            ("vectors_offset", vectors.tobytes()),
+            ("norms_offset", norms.tobytes()),
+            ("protocols_offset", protocol_flags.tobytes()),
+            ("offsets_offset", offsets.tobytes()),
+            ("records_offset", b"".join(records)),
+        ]:
+            f.write(b"\0" * (manifest[key] - f.tell()))
+            f.write(block)
+
+    os.chmod(tmp_path, 0o444)
+    os.replace(tmp_path, path)
+
+
+class IndexArtifact:
+    """通过 mmap 只读打开的预构建索引"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.vectors = self.norms = self._offsets = self._protocol_flags = None
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._load()
+        except Exception:
+            self.close()
+            raise
+
+    def _load(self):
+        """校验文件头和清单，建立各数据块的只读视图；格式错误时抛出 ValueError"""
+        if len(self._mm) < _HEADER.size:
+            raise ValueError(f"Not a Huawei RAG index artifact: {self.path}")
+        magic, version, manifest_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a Huawei RAG index artifact: {self.path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported artifact format version {version} "
+                f"(expected {FORMAT_VERSION})"
+            )
+
+        start = _HEADER.size
+        self.manifest = json.loads(self._mm[start : start + manifest_len])
+        if not isinstance(self.manifest, dict):
+            raise ValueError(f"Corrupt artifact manifest: {self.path}")
+        missing = [
+            key
+            for key in _MANIFEST_INT_KEYS + ("protocols",)
+            if key not in self.manifest
+        ]
+        if missing:
+            raise ValueError(
+                f"Corrupt artifact manifest, missing keys: {', '.join(missing)}"
+            )
+        if not all(
+            isinstance(self.manifest[key], int) and self.manifest[key] >= 0
+            for key in _MANIFEST_INT_KEYS
+        ) or not isinstance(self.manifest["protocols"], list):
+            raise ValueError(f"Corrupt artifact manifest: {self.path}")
+
+        # 数据块越界时 np.frombuffer 会抛出 ValueError
+        count, dim = self.manifest["count"], self.manifest["dim"]
+        self.vectors = np.frombuffer(
+            self._mm, np.float32, count * dim, self.manifest["vectors_offset"]
+        ).reshape(count, dim)
+        self.norms = np.frombuffer(
+            self._mm, np.float32, count, self.manifest["norms_offset"]
+        )
+        self._protocols = {p: i for i, p in enumerate(self.manifest["protocols"])}
+        self._protocol_flags = np.frombuffer(
+            self._mm,
+            np.uint8,
+            count * len(self._protocols),
+            self.manifest["protocols_offset"],
+        ).reshape(count, len(self._protocols))
+        self._offsets = np.frombuffer(
+            self._mm, np.uint64, count + 1, self.manifest["offsets_offset"]
+        )
+        self._records_offset = self.manifest["records_offset"]
+
+    def __len__(self) -> int:
+        return self.manifest["count"]
+
+    def check_model(self, model_name: str, dim: int = None):
+        """校验索引与查询嵌入模型是否兼容，不兼容时抛出 ValueError"""
+        if self.manifest.get("embedding_model") != model_name:
+            raise ValueError(
+                f"Artifact was built with '{self.manifest.get('embedding_model')}', "
+                f"but the query model is '{model_name}'"
+            )
+        if dim is not None and dim != self.manifest["dim"]:
+            raise ValueError(
+                f"Artifact vectors have dimension {self.manifest['dim']}, "
+                f"but the query model produces {dim}"
+            )
+
+    def record(self, index: int) -> dict:
+        """读取第 index 条记录（id, document, metadata）"""
+        start = self._records_offset + int(self._offsets[index])
+        end = self._records_offset + int(self._offsets[index + 1])
+        return json.loads(self._mm[start:end])
+
+    def distances(self, query_embedding) -> np.ndarray:
+        """按集合的距离空间计算查询向量到所有向量的距离"""
+        q = np.asarray(query_embedding, dtype=np.float32)
+        dots = self.vectors @ q
+        space = self.manifest.get("space", "l2")
+        if space == "ip":
+            return 1.0 - dots
+        if space == "cosine":
+            denom = np.sqrt(self.norms) * np.linalg.norm(q)
+            return 1.0 - dots / np.maximum(denom, 1e-12)
+        # 与 ChromaDB 一致，l2 空间使用平方欧氏距离
+        return self.norms + float(q @ q) - 2.0 * dots
+
+    def search(self, query_embedding, top_k: int = 5, filter_protocol: str = None):
+        """
+        暴力检索最近邻
+
+        Returns:
+            list of (record, distance)，按距离升序
+        """
+        dists = self.distances(query_embedding)
+        candidates = np.arange(len(dists))
+
+        # 协议过滤在解码记录之前完成，只解码最终命中的记录
+        if filter_protocol:
+            column = self._protocols.get(filter_protocol)
+            if column is None:
+                return []
+            candidates = np.flatnonzero(self._protocol_flags[:, column])
+
+        k = min(top_k, len(candidates))
+        if not k:
+            return []
+        top = candidates[np.argpartition(dists[candidates], k - 1)[:k]]
+        top = sorted(top, key=lambda i: dists[i])
+        return [(self.record(i), float(dists[i])) for i in top]
+
+    def close(self):
+        self.vectors = self.norms = self._offsets = self._protocol_flags = None
+        self._mm.close()
+
+
+def read_collection(collection, batch_size: int = 1000):
+    """分批读取集合全部数据，返回 (ids, documents, metadatas, embeddings)"""
+    total = collection.count()
+
+    ids, documents, metadatas, embeddings = [], [], [], []
+    for offset in range(0, total, batch_size):
+        batch = collection.get(
+            limit=batch_size,
+            offset=offset,
+            include=["embeddings", "documents", "metadatas"],
+        )
+        ids.extend(batch["ids"])
+        documents.extend(batch["documents"])
+        metadatas.extend(batch["metadatas"])
+        embeddings.extend(batch["embeddings"])
+        print(f"Read {len(ids)}/{total} documents", end="\r")
+    print()
+
+    return ids, documents, metadatas, embeddings
+
+
+def export_collection(output: str, batch_size: int = 1000):
+    """将 ChromaDB 集合导出为索引文件"""
+    import chromadb
+
+    client = chromadb.PersistentClient(path=str(CHROMA_PATH))
+    collection = client.get_collection(COLLECTION_NAME)
+    collection_meta = collection.metadata or {}
+    hnsw_config = (collection.configuration or {}).get("hnsw") or {}
+    ids, documents, metadatas, embeddings = read_collection(collection, batch_size)
+
+    if not ids:
+        print(f"Error: Collection '{COLLECTION_NAME}' is empty")
+        sys.exit(1)
+
+    manifest = {
+        "collection": COLLECTION_NAME,
+        "embedding_model": collection_meta.get("embedding_model", EMBEDDING_MODEL),
+        # 分块参数由 ingest.py 写入集合元数据；旧集合没有记录时为 null
+        "chunk_size": collection_meta.get("chunk_size"),
+        "chunk_overlap": collection_meta.get("chunk_overlap"),
+        "space": hnsw_config.get("space")
+        or collection_meta.get("hnsw:space", "l2"),
+        "collection_metadata": collection_meta,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    write_artifact(output, ids, documents, metadatas, embeddings, manifest)
+    print(f"Exported {len(ids)} documents to {output}")
+
+
+def import_artifact(path: str, reset: bool = False, batch_size: int = 1000):
+    """将索引文件导入到本地 ChromaDB 集合"""
+    import chromadb
+
+    artifact = IndexArtifact(path)
+    CHROMA_PATH.mkdir(parents=True, exist_ok=True)
+    client = chromadb.PersistentClient(path=str(CHROMA_PATH))
+
+    if reset:
+        try:
+            client.delete_collection(COLLECTION_NAME)
+            print("Existing collection deleted.")
+        except Exception:
+            pass
+
+    collection_meta = artifact.manifest.get("collection_metadata") or {
+        "description": "Huawei USG firewall documentation"
+    }
+    collection = client.get_or_create_collection(
+        name=COLLECTION_NAME,
+        metadata=collection_meta,
+        configuration=hnsw_configuration(
+            collection_meta.get("index_profile", DEFAULT_PROFILE)
+        ),
+    )
+
+    for start in range(0, len(artifact), batch_size):
+        end = min(start + batch_size, len(artifact))
+        records = [artifact.record(i) for i in range(start, end)]
+        collection.add(
+            ids=[r["id"] for r in records],
+            documents=[r["document"] for r in records],
+            metadatas=[r["metadata"] for r in records],
+            embeddings=artifact.vectors[start:end].tolist(),
+        )
+        print(f"Imported {end}/{len(artifact)} documents", end="\r")
+    print()
+
+    print(f"Total documents in collection: {collection.count()}")
+    artifact.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export/import prebuilt Huawei docs index artifacts"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser(
+        "export", help="Pack the ChromaDB collection into an artifact"
+    )
+    export_parser.add_argument("output", help="Output artifact path")
+
+    import_parser = subparsers.add_parser(
+        "import", help="Load an artifact into the local ChromaDB collection"
+    )
+    import_parser.add_argument("artifact", help="Artifact path")
+    import_parser.add_argument(
+        "--reset", action="store_true", help="Reset the collection before importing"
+    )
+
+    info_parser = subparsers.add_parser("info", help="Show the artifact manifest")
+    info_parser.add_argument("artifact", help="Artifact path")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_collection(args.output)
+    elif args.command == "import":
+        import_artifact(args.artifact, reset=args.reset)
+    else:
+        artifact = IndexArtifact(args.artifact)
+        print(json.dumps(artifact.manifest, ensure_ascii=False, indent=2))
+        artifact.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+index_profiles.py - HNSW 索引参数档位
+
+用法:
+    python index_profiles.py show
+    python index_profiles.py set accurate
+
+ChromaDB 的 HNSW 参数分为两类:
+- 构建参数 (ef_construction, max_neighbors): 只能在创建集合时设置
+- 检索参数 (ef_search): 可通过 collection.modify 持久修改
+
+ChromaDB 没有单次查询级别的 ef 参数，且 ef_search 只在进程加载索引时读取：
+`python index_profiles.py set <档位>` 只对之后新启动的查询进程生效，
+已经加载了索引的进程仍使用旧值。
+用 tune_index.py 在标注查询集上测量各参数组合的延迟和 recall@k，
+再据此调整下面的档位。
+"""
+
+import argparse
+from pathlib import Path
+import json
+import sys
+
+CHROMA_PATH = Path.home() / ".local/share/huawei-rag/data/chroma"
+COLLECTION_NAME = "huawei_docs"
+CHROMA_DEFAULT_EF_SEARCH = 100
+
+# 距离空间保持 ChromaDB 默认的 l2，与已有集合和相似度换算一致
+INDEX_PROFILES = {
+    "fast": {
+        "space": "l2",
+        "ef_construction": 100,
+        "max_neighbors": 16,
+        "ef_search": 20,
+    },
+    "balanced": {
+        "space": "l2",
+        "ef_construction": 200,
+        "max_neighbors": 16,
+        "ef_search": 100,
+    },
+    "accurate": {
+        "space": "l2",
+        "ef_construction": 400,
+        "max_neighbors": 32,
+        "ef_search": 300,
+    },
+}
+
+DEFAULT_PROFILE = "balanced"
+
+
+def get_profile(name: str) -> dict:
+    """按名称取档位参数，未知名称抛出 ValueError"""
+    if name not in INDEX_PROFILES:
+        raise ValueError(
+            f"Unknown index profile '{name}' "
+            f"(choose from: {', '.join(INDEX_PROFILES)})"
+        )
+    return INDEX_PROFILES[name]
+
+
+def hnsw_configuration(name: str = DEFAULT_PROFILE) -> dict:
+    """创建集合用的 configuration 参数"""
+    return {"hnsw": dict(get_profile(name))}
+
+
+def current_ef_search(collection) -> int:
+    """读取集合当前的 ef_search（未显式设置时为 ChromaDB 默认值）"""
+    hnsw = (collection.configuration or {}).get("hnsw") or {}
+    return hnsw.get("ef_search") or CHROMA_DEFAULT_EF_SEARCH
+
+
+def set_ef_search(collection, ef_search: int):
+    """持久修改集合的 ef_search（已一致时不修改，之后新加载索引的进程生效）"""
+    if current_ef_search(collection) != ef_search:
+        collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Show or set the HNSW search profile of the collection"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("show", help="Show the collection's HNSW settings")
+    set_parser = subparsers.add_parser(
+        "set", help="Persistently set the collection's ef_search from a profile"
+    )
+    set_parser.add_argument("profile", choices=list(INDEX_PROFILES))
+    args = parser.parse_args()
+
+    import chromadb
+
+    client = chromadb.PersistentClient(path=str(CHROMA_PATH))
+    try:
+        collection = client.get_collection(COLLECTION_NAME)
+    except Exception as e:
+        print(f"Error: Collection '{COLLECTION_NAME}' not found: {e}")
+        print("Please run ingest.py first to create the database.")
+        sys.exit(1)
+
+    if args.command == "set":
+        set_ef_search(collection, get_profile(args.profile)["ef_search"])
+        print(f"ef_search set to {current_ef_search(collection)} ({args.profile})")
+        print("Takes effect in query processes started from now on.")
+    else:
+        hnsw = (collection.configuration or {}).get("hnsw") or {}
+        print(json.dumps(hnsw, ensure_ascii=False, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
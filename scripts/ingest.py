@@ -8,6 +8,9 @@ ingest.py - 华为文档数据摄入脚本
     python ingest.py --source /tmp/huawei_chm_extract/V600R025C00/
     python ingest.py --source /tmp/huawei_chm_extract/V600R025C00/ --limit 100
     python ingest.py --source /tmp/huawei_chm_extract/ --limit 500 --batch-size 50
+    python ingest.py --source /tmp/huawei_chm_extract/ --reset --no-parse-cache
+    python ingest.py --source /tmp/huawei_chm_extract/ --reset --profile accurate
+    python ingest.py --source /tmp/huawei_chm_extract/ --reset --no-dedup
 """
 
 import argparse
@@ -16,6 +19,14 @@ from tqdm import tqdm
 import chromadb
 from sentence_transformers import SentenceTransformer
 from html_parser import parse_huawei_html
+from parse_cache import ParseCache
+from index_profiles import (
+    DEFAULT_PROFILE,
+    INDEX_PROFILES,
+    get_profile,
+    hnsw_configuration,
+)
+from dedup import NearDuplicateIndex
 import re
 import sys
 
@@ -24,6 +35,7 @@ CHROMA_PATH = Path.home() / ".local/share/huawei-rag/data/chroma"
 EMBEDDING_MODEL = "thenlper/gte-large-zh"  # 中文优化的嵌入模型
 CHUNK_SIZE = 800  # 字符
 CHUNK_OVERLAP = 100
+MAX_ALIAS_SOURCES = 20  # alias_sources 元数据中最多记录的来源数
 
 
 def chunk_text(
@@ -73,6 +85,219 @@ def chunk_text(
     return chunks
 
 
+def protocol_tag_fields(protocol_tags: dict) -> dict:
+    """
+    将协议标签展开为 ChromaDB 可过滤的标量字段
+
+    ChromaDB 元数据只支持标量值，每个标签存为 proto_<协议>: 命中次数，
+    查询时用 {"proto_ospf": {"$gt": 0}} 即可匹配任意标签。
+    """
+    return {f"proto_{proto}": count for proto, count in protocol_tags.items()}
+
+
+def merge_protocol_tags(metadata: dict, protocol_tags: dict):
+    """
+    把近重复块的协议标签合并进规范块元数据
+
+    protocols 取并集，proto_<协议> 取最大命中次数，保证任一来源页面的
+    协议过滤都能找到这段内容；主协议 protocol 保持规范块自身的值。
+    """
+    protocols = [p for p in metadata.get("protocols", "").split(",") if p]
+    for proto, count in protocol_tags.items():
+        if proto not in protocols:
+            protocols.append(proto)
+        key = f"proto_{proto}"
+        metadata[key] = max(metadata.get(key, 0), count)
+    metadata["protocols"] = ",".join(protocols)
+
+
+def profile_mismatch(collection, profile: str) -> str:
+    """
+    比较已有集合与档位的构建参数
+
+    Returns:
+        str: 不一致时描述集合当前的设置，一致时返回空字符串
+    """
+    current = (collection.metadata or {}).get("index_profile")
+    if current and current != profile:
+        return f"profile '{current}'"
+
+    hnsw = (collection.configuration or {}).get("hnsw") or {}
+    expected = get_profile(profile)
+    differs = [
+        f"{key}={hnsw[key]}"
+        for key in ("space", "ef_construction", "max_neighbors")
+        if key in hnsw and hnsw[key] != expected[key]
+    ]
+    return ", ".join(differs)
+
+
+class DedupState:
+    """摄入过程中的近重复检测状态：LSH 索引、规范块元数据和待写回的别名"""
+
+    def __init__(self):
+        self.index = NearDuplicateIndex()
+        self.canonical_metadatas = {}  # 规范块 ID -> 元数据
+        self.alias_sources = {}  # 规范块 ID -> 重复块来源列表
+        self.pending = {}  # 尚未入库的规范块 ID -> [(重复块文本, 元数据)]
+        self.dirty = set()  # 别名有变化、尚未写回 ChromaDB 的规范块
+        self.duplicate_chunks = 0
+
+    def seed(self, collection, batch_size: int = 1000) -> int:
+        """
+        把集合中已有的文本块收录为规范块（追加摄入时与之前的运行去重）
+
+        Returns:
+            int: 收录的规范块数量
+        """
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            batch = collection.get(
+                limit=batch_size, offset=offset, include=["documents", "metadatas"]
+            )
+            for chunk_id, chunk, metadata in zip(
+                batch["ids"], batch["documents"], batch["metadatas"]
+            ):
+                # 之前以 --no-dedup 摄入的重复块不作为规范块
+                if self.index.find_or_add(chunk_id, chunk) is not None:
+                    continue
+                self.canonical_metadatas[chunk_id] = metadata
+                self.alias_sources[chunk_id] = [
+                    s for s in metadata.get("alias_sources", "").split("; ") if s
+                ]
+        return len(self.index)
+
+    def collapse(self, chunk_id: str, chunk: str, metadata: dict) -> bool:
+        """
+        检查文本块是否与已收录的规范块近重复
+
+        近重复时把来源和协议标签并入规范块并返回 True；
+        否则把当前块收录为规范块并返回 False。
+        """
+        canonical_id = self.index.find_or_add(chunk_id, chunk)
+        if canonical_id is None:
+            self.canonical_metadatas[chunk_id] = metadata
+            self.pending[chunk_id] = []
+            return False
+
+        self.duplicate_chunks += 1
+        if canonical_id in self.pending:
+            # 规范块所在批次写入失败时，这些重复块需要重新排队
+            self.pending[canonical_id].append((chunk, metadata))
+
+        canonical = self.canonical_metadatas[canonical_id]
+        source = metadata["source_file"]
+        sources = self.alias_sources.setdefault(canonical_id, [])
+        if source != canonical["source_file"] and source not in sources:
+            sources.append(source)
+            merge_protocol_tags(
+                canonical,
+                {
+                    key[len("proto_") :]: value
+                    for key, value in metadata.items()
+                    if key.startswith("proto_")
+                },
+            )
+            canonical["alias_sources"] = "; ".join(sources[:MAX_ALIAS_SOURCES])
+            # alias_sources 有长度上限，计数在已入库的值上累加
+            canonical["alias_count"] = canonical.get("alias_count", 0) + 1
+            self.dirty.add(canonical_id)
+        return True
+
+    def stored(self, ids: list):
+        """批次写入成功，其中的规范块不再需要保留重复块"""
+        for chunk_id in ids:
+            self.pending.pop(chunk_id, None)
+
+    def forget(self, ids: list) -> list:
+        """
+        批次写入失败时移除其中的规范块
+
+        Returns:
+            list of (文本块, 元数据): 折叠到这些规范块上的重复块，
+            需要重新排队，其中第一个会成为新的规范块
+        """
+        requeue = []
+        for chunk_id in ids:
+            self.index.remove(chunk_id)
+            self.canonical_metadatas.pop(chunk_id, None)
+            self.alias_sources.pop(chunk_id, None)
+            self.dirty.discard(chunk_id)
+            requeue.extend(self.pending.pop(chunk_id, []))
+        self.duplicate_chunks -= len(requeue)
+        return requeue
+
+    def flush_aliases(self, collection, stored_ids: list = ()):
+        """
+        把已入库规范块的新别名写回 ChromaDB
+
+        stored_ids 是刚写入的批次，其元数据已包含最新别名，无需再更新。
+        """
+        ids = sorted(self.dirty - set(stored_ids))
+        self.dirty.clear()
+        if not ids:
+            return
+        try:
+            collection.update(
+                ids=ids, metadatas=[self.canonical_metadatas[cid] for cid in ids]
+            )
+        except Exception as e:
+            print(f"\nWarning: Alias metadata update failed: {e}")
+            self.dirty.update(ids)  # 下一批次再试
+
+    @property
+    def canonical_with_aliases(self) -> int:
+        return sum(1 for sources in self.alias_sources.values() if sources)
+
+
+def fill_batch(
+    batch_docs, batch_metadatas, batch_ids, pending_chunks, dedup, doc_id, batch_size
+) -> int:
+    """
+    从待处理队列取出文本块，去重并分配 ID，直到批次凑满或队列为空
+
+    Returns:
+        int: 下一个可用的文档编号
+    """
+    while pending_chunks and len(batch_docs) < batch_size:
+        chunk, metadata = pending_chunks.pop(0)
+        chunk_id = f"doc_{doc_id}"
+        if dedup and dedup.collapse(chunk_id, chunk, metadata):
+            continue
+
+        batch_docs.append(chunk)
+        batch_metadatas.append(metadata)
+        batch_ids.append(chunk_id)
+        doc_id += 1
+    return doc_id
+
+
+def submit_batch(collection, model, docs, metadatas, ids, dedup=None) -> list:
+    """
+    嵌入并写入一个批次，随后写回别名；写入失败时撤销该批次的去重记录
+
+    Returns:
+        list of (文本块, 元数据): 需要重新排队的重复块
+    """
+    try:
+        embeddings = model.encode(docs, show_progress_bar=False)
+        collection.add(
+            documents=docs,
+            embeddings=embeddings.tolist(),
+            metadatas=metadatas,
+            ids=ids,
+        )
+    except Exception as e:
+        print(f"\nWarning: Batch insert failed: {e}")
+        return dedup.forget(ids) if dedup else []
+
+    # 每个批次后写回别名，长时间摄入中断时最多丢失一个批次的别名
+    if dedup:
+        dedup.stored(ids)
+        dedup.flush_aliases(collection, ids)
+    return []
+
+
 def main():
     parser = argparse.ArgumentParser(description="Ingest Huawei docs into ChromaDB")
     parser.add_argument(
@@ -87,6 +312,23 @@ def main():
     parser.add_argument(
         "--reset", action="store_true", help="Reset the database before ingesting"
     )
+    parser.add_argument(
+        "--no-parse-cache",
+        action="store_true",
+        help="Parse every HTML file again instead of using the parse cache",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(INDEX_PROFILES),
+        default=DEFAULT_PROFILE,
+        help=f"HNSW index profile for a new collection (default: {DEFAULT_PROFILE})",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Keep near-duplicate chunks instead of collapsing them "
+        "(by default new chunks are also checked against the existing collection)",
+    )
     args = parser.parse_args()
 
     source_path = Path(args.source)
@@ -113,9 +355,24 @@ def main():
 
     collection = client.get_or_create_collection(
         name="huawei_docs",
-        metadata={"description": "Huawei USG firewall documentation"},
+        metadata={
+            "description": "Huawei USG firewall documentation",
+            "embedding_model": EMBEDDING_MODEL,
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "index_profile": args.profile,
+        },
+        configuration=hnsw_configuration(args.profile),
     )
 
+    # 已有集合沿用创建时的 HNSW 构建参数，--profile 只对新集合生效
+    mismatch = profile_mismatch(collection, args.profile)
+    if mismatch:
+        print(
+            f"Warning: --profile {args.profile} ignored, existing collection "
+            f"uses {mismatch}. Use --reset to rebuild with the new profile."
+        )
+
     existing_count = collection.count()
     print(f"Existing documents in collection: {existing_count}")
 
@@ -127,19 +384,28 @@ def main():
         html_files = html_files[: args.limit]
         print(f"Processing limited to {args.limit} files")
 
+    # 解析缓存：分块或元数据调整后重新摄入时跳过 HTML 解析
+    parse_cache = None if args.no_parse_cache else ParseCache()
+    parse = parse_cache.parse if parse_cache else parse_huawei_html
+
+    # 近重复检测：只收录规范块，重复块的来源记为规范块的别名
+    dedup = None if args.no_dedup else DedupState()
+    if dedup and existing_count:
+        print(f"Loaded {dedup.seed(collection)} existing chunks for deduplication")
+
     # 批量处理
     batch_docs = []
     batch_metadatas = []
     batch_ids = []
+    pending_chunks = []  # (文本块, 元数据)，等待去重和分配 ID
     doc_id = existing_count  # 从现有文档数开始编号
 
     processed_files = 0
     skipped_files = 0
-    total_chunks = 0
 
     for file_path in tqdm(html_files, desc="Processing files"):
         try:
-            result = parse_huawei_html(str(file_path))
+            result = parse(str(file_path))
 
             # 跳过内容太少的文件
             if len(result["text"]) < 100:
@@ -153,39 +419,19 @@ def main():
                 if len(chunk) < 50:  # 跳过太短的块
                     continue
 
-                batch_docs.append(chunk)
-                batch_metadatas.append(
-                    {
-                        "source_file": str(file_path),
-                        "protocol": result["metadata"]["protocol"],
-                        "chunk_index": i,
-                        "title": result["title"][:200] if result["title"] else "",
-                        "commands": "; ".join(result["commands"][:5])[
-                            :500
-                        ],  # 前5个命令，限制长度
-                        "command_count": result["metadata"]["command_count"],
-                    }
-                )
-                batch_ids.append(f"doc_{doc_id}")
-                doc_id += 1
-                total_chunks += 1
-
-                # 批量提交
-                if len(batch_docs) >= args.batch_size:
-                    try:
-                        embeddings = model.encode(batch_docs, show_progress_bar=False)
-                        collection.add(
-                            documents=batch_docs,
-                            embeddings=embeddings.tolist(),
-                            metadatas=batch_metadatas,
-                            ids=batch_ids,
-                        )
-                    except Exception as e:
-                        print(f"\nWarning: Batch insert failed: {e}")
-
-                    batch_docs = []
-                    batch_metadatas = []
-                    batch_ids = []
+                metadata = {
+                    "source_file": str(file_path),
+                    "protocol": result["metadata"]["protocol"],
+                    "protocols": ",".join(result["metadata"]["protocol_tags"]),
+                    **protocol_tag_fields(result["metadata"]["protocol_tags"]),
+                    "chunk_index": i,
+                    "title": result["title"][:200] if result["title"] else "",
+                    "commands": "; ".join(result["commands"][:5])[
+                        :500
+                    ],  # 前5个命令，限制长度
+                    "command_count": result["metadata"]["command_count"],
+                }
+                pending_chunks.append((chunk, metadata))
 
             processed_files += 1
 
@@ -194,18 +440,55 @@ def main():
             skipped_files += 1
             continue
 
-    # 提交剩余批次
-    if batch_docs:
-        try:
-            embeddings = model.encode(batch_docs, show_progress_bar=False)
-            collection.add(
-                documents=batch_docs,
-                embeddings=embeddings.tolist(),
-                metadatas=batch_metadatas,
-                ids=batch_ids,
+        # 批量提交；写入失败批次中规范块的重复块会重新排队
+        while True:
+            doc_id = fill_batch(
+                batch_docs,
+                batch_metadatas,
+                batch_ids,
+                pending_chunks,
+                dedup,
+                doc_id,
+                args.batch_size,
             )
-        except Exception as e:
-            print(f"\nWarning: Final batch insert failed: {e}")
+            if len(batch_docs) < args.batch_size:
+                break
+            pending_chunks.extend(
+                submit_batch(
+                    collection, model, batch_docs, batch_metadatas, batch_ids, dedup
+                )
+            )
+            batch_docs = []
+            batch_metadatas = []
+            batch_ids = []
+
+    # 提交剩余批次（包括重新排队的重复块组成的批次）
+    while batch_docs:
+        pending_chunks.extend(
+            submit_batch(
+                collection, model, batch_docs, batch_metadatas, batch_ids, dedup
+            )
+        )
+        batch_docs = []
+        batch_metadatas = []
+        batch_ids = []
+        doc_id = fill_batch(
+            batch_docs,
+            batch_metadatas,
+            batch_ids,
+            pending_chunks,
+            dedup,
+            doc_id,
+            args.batch_size,
+        )
+    total_chunks = doc_id - existing_count
+
+    # 重试之前写回失败的别名
+    if dedup:
+        dedup.flush_aliases(collection)
+
+    if parse_cache:
+        parse_cache.close()
 
     # 输出统计
     print("\n" + "=" * 50)
@@ -214,6 +497,16 @@ def main():
     print(f"Files processed: {processed_files}")
     print(f"Files skipped: {skipped_files}")
     print(f"Total chunks created: {total_chunks}")
+    if dedup:
+        print(
+            f"Near-duplicate chunks collapsed: {dedup.duplicate_chunks} "
+            f"({dedup.canonical_with_aliases} canonical chunks with alias sources)"
+        )
+    if parse_cache:
+        print(
+            f"Parse cache: {parse_cache.hits} hits, {parse_cache.misses} misses "
+            f"({parse_cache.path})"
+        )
     print(f"Total documents in collection: {collection.count()}")
     print(f"Database location: {CHROMA_PATH}")
 
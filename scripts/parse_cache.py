@@ -0,0 +1,83 @@
+"""
+parse_cache.py - HTML 解析结果缓存
+
+将 parse_huawei_html 的结果（text, commands, title, metadata）以
+zlib 压缩的 pickle 存入 SQLite 单文件，键为文件路径，并校验内容哈希
+和解析器版本。调整分块参数或元数据布局后重新摄入，只需重新分块和嵌入，
+不必再解码和解析 HTML。
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import pickle
+import sqlite3
+import zlib
+
+from html_parser import PARSER_VERSION, PROTOCOL_KEYWORDS, parse_huawei_html
+
+CACHE_PATH = Path.home() / ".local/share/huawei-rag/data/parse_cache.sqlite"
+
+
+def cache_version() -> str:
+    """缓存版本：解析器版本 + 协议关键词表哈希，关键词表变化时缓存自动失效"""
+    table = json.dumps(PROTOCOL_KEYWORDS, ensure_ascii=False).encode("utf-8")
+    return f"{PARSER_VERSION}-{hashlib.sha1(table).hexdigest()[:12]}"
+
+
+class ParseCache:
+    """按 (文件路径, 内容哈希, 解析器版本) 缓存解析结果"""
+
+    def __init__(self, path: Path = CACHE_PATH, version: str = None):
+        self.path = Path(path)
+        self.version = version or cache_version()
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS parsed (
+                path TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                version TEXT NOT NULL,
+                payload BLOB NOT NULL
+            )
+            """
+        )
+        self._pending = 0
+
+    def parse(self, file_path: str) -> dict:
+        """返回解析结果，缓存命中时跳过 HTML 解析"""
+        file_path = str(file_path)
+        with open(file_path, "rb") as f:
+            content_hash = hashlib.sha1(f.read()).hexdigest()
+
+        row = self._conn.execute(
+            "SELECT content_hash, version, payload FROM parsed WHERE path = ?",
+            (file_path,),
+        ).fetchone()
+        if row and row[0] == content_hash and row[1] == self.version:
+            self.hits += 1
+            return pickle.loads(zlib.decompress(row[2]))
+
+        self.misses += 1
+        result = parse_huawei_html(file_path)
+        payload = zlib.compress(pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO parsed VALUES (?, ?, ?, ?)",
+            (file_path, content_hash, self.version, payload),
+        )
+
+        # 定期提交，避免中断时丢失全部缓存
+        self._pending += 1
+        if self._pending >= 200:
+            self._conn.commit()
+            self._pending = 0
+
+        return result
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
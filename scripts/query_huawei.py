@@ -7,6 +7,8 @@ query_huawei.py - 查询华为文档向量数据库
     python query_huawei.py "IPsec VPN" --top-k 5
     python query_huawei.py "防火墙安全策略" --verbose
     python query_huawei.py "NAT 配置" --json
+    python query_huawei.py "OSPF 区域" --index huawei_docs.hwidx
+    python query_huawei.py "ACL 规则" --no-diversify
 """
 
 import argparse
@@ -16,12 +18,18 @@ from pathlib import Path
 import json
 import sys
 
+from index_artifact import IndexArtifact
+from dedup import collapse_near_duplicates
+
 # 配置
 CHROMA_PATH = Path.home() / ".local/share/huawei-rag/data/chroma"
 EMBEDDING_MODEL = "thenlper/gte-large-zh"
+DIVERSIFY_FACTOR = 3  # 结果去重时多取的候选倍数
 
 # 全局模型缓存
 _model = None
+# 已打开的预构建索引缓存 {路径: IndexArtifact}
+_artifacts = {}
 
 
 def get_model():
@@ -32,7 +40,46 @@ def get_model():
     return _model
 
 
-def query(query_text: str, top_k: int = 5, filter_protocol: str = None) -> list:
+def protocol_filter(protocol: str) -> dict:
+    """构建协议过滤条件：匹配主协议或任一协议标签"""
+    return {
+        "$or": [
+            {"protocol": protocol},
+            {f"proto_{protocol}": {"$gt": 0}},
+        ]
+    }
+
+
+def protocol_list(metadata: dict) -> list:
+    """从元数据中取出协议标签列表（兼容只有主协议的旧数据）"""
+    tags = metadata.get("protocols", "")
+    if tags:
+        return tags.split(",")
+    return [metadata.get("protocol", "unknown")]
+
+
+def get_artifact(index_path: str) -> IndexArtifact:
+    """打开预构建索引（带缓存），并校验与嵌入模型的兼容性"""
+    if index_path not in _artifacts:
+        try:
+            artifact = IndexArtifact(index_path)
+            artifact.check_model(
+                EMBEDDING_MODEL, get_model().get_sentence_embedding_dimension()
+            )
+        except (OSError, ValueError) as e:
+            print(f"Error: Cannot use index artifact {index_path}: {e}")
+            sys.exit(1)
+        _artifacts[index_path] = artifact
+    return _artifacts[index_path]
+
+
+def query(
+    query_text: str,
+    top_k: int = 5,
+    filter_protocol: str = None,
+    index_path: str = None,
+    diversify: bool = True,
+) -> list:
     """
     查询向量数据库
 
@@ -40,6 +87,8 @@ def query(query_text: str, top_k: int = 5, filter_protocol: str = None) -> list:
         query_text: 查询文本
         top_k: 返回结果数量
         filter_protocol: 可选的协议过滤器
+        index_path: 可选的预构建索引文件，指定时不访问 ChromaDB
+        diversify: 是否折叠近重复结果（多取候选，每组只保留最相关的一条）
 
     Returns:
         list of dict: [
@@ -47,13 +96,27 @@ def query(query_text: str, top_k: int = 5, filter_protocol: str = None) -> list:
                 "text": str,       # 文档片段
                 "commands": str,   # 相关命令
                 "source": str,     # 源文件
-                "protocol": str,   # 协议类型
+                "protocol": str,   # 主协议类型
+                "protocols": list, # 全部协议标签
                 "title": str,      # 文档标题
-                "score": float     # 相似度分数
+                "score": float,    # 相似度分数
+                "aliases": list    # 内容近似相同的其他源文件
             }
         ]
     """
     model = get_model()
+    n_candidates = top_k * DIVERSIFY_FACTOR if diversify else top_k
+
+    if index_path:
+        artifact = get_artifact(index_path)
+        query_embedding = model.encode([query_text])[0]
+        hits = [
+            (record["document"], record["metadata"], distance)
+            for record, distance in artifact.search(
+                query_embedding, n_candidates, filter_protocol
+            )
+        ]
+        return format_hits(hits, top_k, diversify)
 
     # 检查数据库是否存在
     if not CHROMA_PATH.exists():
@@ -76,47 +139,88 @@ def query(query_text: str, top_k: int = 5, filter_protocol: str = None) -> list:
     # 构建查询参数
     query_kwargs = {
         "query_embeddings": [query_embedding],
-        "n_results": top_k,
+        "n_results": n_candidates,
         "include": ["documents", "metadatas", "distances"],
     }
 
-    # 添加协议过滤器
+    # 添加协议过滤器（主协议或任一协议标签命中即可）
     if filter_protocol:
-        query_kwargs["where"] = {"protocol": filter_protocol}
+        query_kwargs["where"] = protocol_filter(filter_protocol)
 
     # 执行查询
     results = collection.query(**query_kwargs)
 
     # 格式化输出
-    output = []
-    for i in range(len(results["ids"][0])):
-        doc = results["documents"][0][i]
-        metadata = results["metadatas"][0][i]
-        distance = results["distances"][0][i]
+    hits = list(
+        zip(
+            results["documents"][0],
+            results["metadatas"][0],
+            results["distances"][0],
+        )
+    )
+    return format_hits(hits, top_k, diversify)
 
-        # 限制文本长度以便显示
-        text = doc[:800] + "..." if len(doc) > 800 else doc
 
-        output.append(
-            {
-                "text": text,
-                "commands": metadata.get("commands", ""),
-                "source": metadata.get("source_file", ""),
-                "protocol": metadata.get("protocol", "unknown"),
-                "title": metadata.get("title", ""),
-                "score": round(1 - distance, 4),  # 转换距离为相似度
-            }
-        )
+def format_hits(hits: list, top_k: int, diversify: bool = True) -> list:
+    """
+    折叠近重复命中并转换为输出结构
+
+    Args:
+        hits: [(文档, 元数据, 距离)]，按距离升序
+        top_k: 返回结果数量
+        diversify: 是否折叠近重复结果
+    """
+    if not diversify:
+        return [format_hit(doc, meta, dist) for doc, meta, dist in hits[:top_k]]
 
+    output = []
+    groups = collapse_near_duplicates([doc for doc, _, _ in hits])
+    for kept, duplicates in groups[:top_k]:
+        doc, metadata, distance = hits[kept]
+        collapsed = []
+        for i in duplicates:
+            collapsed.append(hits[i][1].get("source_file", ""))
+            collapsed.extend(alias_list(hits[i][1]))
+        output.append(format_hit(doc, metadata, distance, collapsed))
     return output
 
 
+def format_hit(
+    doc: str, metadata: dict, distance: float, collapsed_sources: list = None
+) -> dict:
+    """将一条检索命中转换为输出结构"""
+    # 限制文本长度以便显示
+    text = doc[:800] + "..." if len(doc) > 800 else doc
+
+    return {
+        "text": text,
+        "commands": metadata.get("commands", ""),
+        "source": metadata.get("source_file", ""),
+        "protocol": metadata.get("protocol", "unknown"),
+        "protocols": protocol_list(metadata),
+        "title": metadata.get("title", ""),
+        "score": round(1 - distance, 4),  # 转换距离为相似度
+        "aliases": alias_list(metadata, collapsed_sources),
+    }
+
+
+def alias_list(metadata: dict, collapsed_sources: list = None) -> list:
+    """合并摄入时记录的别名来源和查询时折叠掉的来源（去重、排除自身）"""
+    aliases = [s for s in metadata.get("alias_sources", "").split("; ") if s]
+    for source in collapsed_sources or []:
+        if source and source not in aliases:
+            aliases.append(source)
+    own = metadata.get("source_file", "")
+    return [s for s in aliases if s != own]
+
+
 def format_result(result: dict, index: int, verbose: bool = False) -> str:
     """格式化单个结果为可读文本"""
     lines = [
         f"\n{'=' * 70}",
         f"[{index}] {result['title'] or 'Untitled'}",
         f"    Protocol: {result['protocol']} | Score: {result['score']:.2%}",
+        f"    Tags: {', '.join(result['protocols'])}",
         f"{'=' * 70}",
     ]
 
@@ -141,6 +245,11 @@ def format_result(result: dict, index: int, verbose: bool = False) -> str:
             lines.append("   ...")
 
         lines.append(f"\n\U0001f4c1 来源: {Path(result['source']).name}")
+        if result["aliases"]:
+            names = ", ".join(Path(s).name for s in result["aliases"][:5])
+            if len(result["aliases"]) > 5:
+                names += f" 等 {len(result['aliases'])} 个"
+            lines.append(f"   相同内容另见: {names}")
 
     return "\n".join(lines)
 
@@ -155,6 +264,8 @@ Examples:
   %(prog)s "IPsec VPN 站点到站点" --top-k 5
   %(prog)s "NAT 地址池" --protocol nat --verbose
   %(prog)s "安全策略" --json
+  %(prog)s "OSPF 区域" --index huawei_docs.hwidx
+  %(prog)s "ACL 规则" --no-diversify
         """,
     )
     parser.add_argument("query", help="Search query in Chinese or English")
@@ -172,10 +283,28 @@ Examples:
         default=None,
         help="Filter by protocol (ospf, bgp, ipsec, vpn, nat, acl, firewall, etc.)",
     )
+    parser.add_argument(
+        "--index",
+        "-i",
+        type=str,
+        default=None,
+        help="Query a prebuilt index artifact (see index_artifact.py) instead of ChromaDB",
+    )
+    parser.add_argument(
+        "--no-diversify",
+        action="store_true",
+        help="Return near-duplicate results instead of collapsing them",
+    )
     args = parser.parse_args()
 
     # 执行查询
-    results = query(args.query, args.top_k, args.protocol)
+    results = query(
+        args.query,
+        args.top_k,
+        args.protocol,
+        args.index,
+        diversify=not args.no_diversify,
+    )
 
     if not results:
         print("No results found.")
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+tune_index.py - HNSW 参数自动调优
+
+读取已摄入集合的向量，在内存中按每组 (max_neighbors, ef_construction, ef_search)
+重建索引（ChromaDB 的 ef_search 只在加载索引时生效），运行标注查询集，
+报告延迟与 recall@k，推荐满足召回目标的最快参数组合。
+
+查询集为 JSONL，每行一个查询:
+    {"query": "配置 OSPF 区域", "relevant_sources": ["dc_ospf_cfg_0001.html"]}
+    {"query": "NAT 地址池", "relevant_ids": ["doc_1024", "doc_1025"]}
+    {"query": "IPsec 安全提议"}
+
+relevant_sources 按源文件名匹配，relevant_ids 按文档 ID 匹配；
+两者都未给出时，以精确（暴力）检索的 top_k 结果作为标注，衡量 HNSW 近似召回。
+
+用法:
+    python tune_index.py queries.jsonl
+    python tune_index.py queries.jsonl --top-k 10 --target-recall 0.95
+    python tune_index.py queries.jsonl --max-neighbors 16 32 --ef-search 20 50 100
+"""
+
+import argparse
+from pathlib import Path
+import json
+import sys
+import time
+
+import chromadb
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from index_artifact import read_collection
+from index_profiles import INDEX_PROFILES
+
+# 配置
+CHROMA_PATH = Path.home() / ".local/share/huawei-rag/data/chroma"
+COLLECTION_NAME = "huawei_docs"
+EMBEDDING_MODEL = "thenlper/gte-large-zh"
+
+
+def load_queries(path: str) -> list:
+    """读取 JSONL 标注查询集"""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if "query" not in item:
+                raise ValueError(f"{path}:{line_no}: missing 'query' field")
+            queries.append(item)
+    return queries
+
+
+def build_labels(queries, query_embeddings, ids, vectors, top_k) -> list:
+    """
+    为每个查询生成标注集合
+
+    Returns:
+        list of (kind, set): kind 为 "id" 或 "source"
+    """
+    labels = []
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    for item, q in zip(queries, query_embeddings):
+        if item.get("relevant_ids"):
+            labels.append(("id", set(item["relevant_ids"])))
+        elif item.get("relevant_sources"):
+            labels.append(("source", {Path(s).name for s in item["relevant_sources"]}))
+        else:
+            # 无标注时以精确检索结果为准（l2 平方距离，与 ChromaDB 一致）
+            dists = norms - 2.0 * (vectors @ q)
+            exact = np.argsort(dists)[:top_k]
+            labels.append(("id", {ids[i] for i in exact}))
+    return labels
+
+
+def recall_at_k(result_ids: list, label: tuple, sources: dict) -> float:
+    """计算单个查询的 recall@k"""
+    kind, relevant = label
+    if kind == "id":
+        found = relevant & set(result_ids)
+    else:
+        found = relevant & {sources[i] for i in result_ids}
+    return len(found) / len(relevant)
+
+
+def evaluate(collection, query_embeddings, labels, sources, top_k) -> dict:
+    """对当前 ef_search 运行全部查询，统计延迟和召回"""
+    # 预热，避免首次查询的加载开销计入延迟
+    collection.query(query_embeddings=[query_embeddings[0]], n_results=top_k)
+
+    latencies = []
+    recalls = []
+    for q, label in zip(query_embeddings, labels):
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[q], n_results=top_k, include=[])
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(recall_at_k(result["ids"][0], label, sources))
+
+    return {
+        "latency_ms": float(np.mean(latencies)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "recall": float(np.mean(recalls)),
+    }
+
+
+def sweep(args):
+    """遍历构建参数和检索参数，返回结果列表"""
+    client = chromadb.PersistentClient(path=str(CHROMA_PATH))
+    try:
+        source = client.get_collection(COLLECTION_NAME)
+    except Exception as e:
+        print(f"Error: Collection '{COLLECTION_NAME}' not found: {e}")
+        print("Please run ingest.py first to create the database.")
+        sys.exit(1)
+
+    ids, _, metadatas, embeddings = read_collection(source)
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    sources = {
+        doc_id: Path(meta.get("source_file", "")).name
+        for doc_id, meta in zip(ids, metadatas)
+    }
+
+    queries = load_queries(args.queries)
+    if not queries:
+        print(f"Error: No queries found in {args.queries}")
+        print('Each line must be a JSON object with a "query" field.')
+        sys.exit(1)
+    print(f"Loading embedding model: {EMBEDDING_MODEL}")
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    query_embeddings = model.encode([item["query"] for item in queries]).astype(
+        np.float32
+    )
+    labels = build_labels(queries, query_embeddings, ids, vectors, args.top_k)
+    query_embeddings = query_embeddings.tolist()
+
+    # ChromaDB 对已加载的索引调用 modify(ef_search) 不生效，
+    # 因此每个 ef_search 都在创建集合时指定并重新构建索引
+    scratch = chromadb.EphemeralClient()
+    results = []
+    for max_neighbors in args.max_neighbors:
+        for ef_construction in args.ef_construction:
+            for ef_search in args.ef_search:
+                name = f"tune_m{max_neighbors}_efc{ef_construction}_ef{ef_search}"
+                collection = scratch.create_collection(
+                    name=name,
+                    configuration={
+                        "hnsw": {
+                            "space": "l2",
+                            "max_neighbors": max_neighbors,
+                            "ef_construction": ef_construction,
+                            "ef_search": ef_search,
+                        }
+                    },
+                )
+
+                start = time.perf_counter()
+                for i in range(0, len(ids), args.batch_size):
+                    collection.add(
+                        ids=ids[i : i + args.batch_size],
+                        embeddings=embeddings[i : i + args.batch_size],
+                    )
+                build_s = time.perf_counter() - start
+
+                stats = evaluate(
+                    collection, query_embeddings, labels, sources, args.top_k
+                )
+                stats.update(
+                    max_neighbors=max_neighbors,
+                    ef_construction=ef_construction,
+                    ef_search=ef_search,
+                    build_s=build_s,
+                )
+                results.append(stats)
+                print(
+                    f"M={max_neighbors:<3} efc={ef_construction:<4} "
+                    f"ef={ef_search:<4} recall@{args.top_k}={stats['recall']:.3f} "
+                    f"latency={stats['latency_ms']:.2f}ms"
+                )
+
+                scratch.delete_collection(name)
+
+    return results
+
+
+def ef_search_warnings(results: list) -> list:
+    """
+    检查 ef_search 是否真正生效
+
+    同一构建参数下，多个 ef_search 的 recall 完全相同且未达到 1.0，
+    说明检索参数很可能没有被索引采用，调优结果不可信。
+    """
+    groups = {}
+    for r in results:
+        key = (r["max_neighbors"], r["ef_construction"])
+        groups.setdefault(key, []).append(r)
+
+    warnings = []
+    for (max_neighbors, ef_construction), group in groups.items():
+        recalls = {round(r["recall"], 6) for r in group}
+        if len(group) > 1 and len(recalls) == 1 and max(recalls) < 1.0:
+            warnings.append(
+                f"⚠️  M={max_neighbors}, ef_construction={ef_construction}: "
+                f"recall 在所有 ef_search 下都是 {group[0]['recall']:.3f}，"
+                "ef_search 可能没有生效"
+            )
+    return warnings
+
+
+def matching_profile(result: dict) -> str:
+    """返回与参数组合完全一致的命名档位"""
+    for name, profile in INDEX_PROFILES.items():
+        if all(
+            profile[key] == result[key]
+            for key in ("max_neighbors", "ef_construction", "ef_search")
+        ):
+            return name
+    return ""
+
+
+def format_report(results: list, top_k: int, target_recall: float) -> str:
+    """格式化调优报告"""
+    lines = [
+        "\n" + "=" * 78,
+        "HNSW 调优报告",
+        "=" * 78,
+        f"{'M':>4} {'ef_con':>7} {'ef_search':>10} {'recall@' + str(top_k):>10} "
+        f"{'mean ms':>9} {'p95 ms':>8} {'build s':>8}  profile",
+    ]
+    for r in sorted(results, key=lambda r: r["latency_ms"]):
+        lines.append(
+            f"{r['max_neighbors']:>4} {r['ef_construction']:>7} {r['ef_search']:>10} "
+            f"{r['recall']:>10.3f} {r['latency_ms']:>9.2f} {r['p95_ms']:>8.2f} "
+            f"{r['build_s']:>8.1f}  {matching_profile(r)}"
+        )
+
+    qualified = [r for r in results if r["recall"] >= target_recall]
+    lines.append("=" * 78)
+    lines.extend(ef_search_warnings(results))
+    if qualified:
+        best = min(qualified, key=lambda r: (r["latency_ms"], r["build_s"]))
+        lines.append(
+            f"推荐 (recall@{top_k} >= {target_recall}): "
+            f"max_neighbors={best['max_neighbors']}, "
+            f"ef_construction={best['ef_construction']}, "
+            f"ef_search={best['ef_search']} "
+            f"({best['latency_ms']:.2f}ms, recall {best['recall']:.3f})"
+        )
+    else:
+        best = max(results, key=lambda r: r["recall"])
+        lines.append(
+            f"⚠️  没有组合达到 recall@{top_k} >= {target_recall}，"
+            f"最高为 {best['recall']:.3f} "
+            f"(max_neighbors={best['max_neighbors']}, "
+            f"ef_construction={best['ef_construction']}, "
+            f"ef_search={best['ef_search']})"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep HNSW parameters against a labeled query set"
+    )
+    parser.add_argument("queries", help="JSONL file with labeled queries")
+    parser.add_argument(
+        "--top-k", "-k", type=int, default=5, help="Recall cutoff (default: 5)"
+    )
+    parser.add_argument(
+        "--target-recall",
+        "-t",
+        type=float,
+        default=0.9,
+        help="Minimum acceptable recall@k (default: 0.9)",
+    )
+    parser.add_argument(
+        "--max-neighbors",
+        type=int,
+        nargs="+",
+        default=[16, 32, 48],
+        help="HNSW M values to build (default: 16 32 48)",
+    )
+    parser.add_argument(
+        "--ef-construction",
+        type=int,
+        nargs="+",
+        default=[100, 200, 400],
+        help="ef_construction values to build (default: 100 200 400)",
+    )
+    parser.add_argument(
+        "--ef-search",
+        type=int,
+        nargs="+",
+        default=[10, 20, 50, 100, 200, 400],
+        help="ef_search values to query with (default: 10 20 50 100 200 400)",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1000, help="Batch size for index building"
+    )
+    parser.add_argument("--json", "-j", action="store_true", help="Output as JSON")
+    args = parser.parse_args()
+
+    results = sweep(args)
+    if not results:
+        print("No parameter combinations evaluated.")
+        return
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(results, args.top_k, args.target_recall))
+
+
+if __name__ == "__main__":
+    main()